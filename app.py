@@ -2,7 +2,6 @@ import os
 
 from flask import Flask, render_template, request, flash, redirect, session, g
 from flask_debugtoolbar import DebugToolbarExtension
-from sqlalchemy.exc import IntegrityError
 
 from forms import UserAddForm, LoginForm, MessageForm, UserUpdateForm
 from models import db, connect_db, User, Message
@@ -20,6 +19,10 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ECHO'] = False
 app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = True
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "it's a secret")
+
+# bcrypt work factor for password hashes; tests lower this to keep
+# User.signup fast, production uses bcrypt's default of 12.
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
 toolbar = DebugToolbarExtension(app)
 
 connect_db(app)
@@ -62,8 +65,8 @@ def signup():
 
     If form not valid, present form.
 
-    If the there already is a user with that username: flash message
-    and re-present form.
+    If the there already is a user with that username (or signup rejects
+    the details for any other reason): flash message and re-present form.
     """
 
     form = UserAddForm()
@@ -78,8 +81,8 @@ def signup():
             )
             db.session.commit()
 
-        except IntegrityError:
-            flash("Username already taken", 'danger')
+        except ValueError as err:
+            flash(str(err), 'danger')
             return render_template('users/signup.html', form=form)
 
         do_login(user)
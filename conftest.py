@@ -0,0 +1,374 @@
+"""Shared setup for the Warbler test suite.
+
+Run the tests like:
+
+    python -m pytest
+
+or spread them across CPU cores (each worker gets its own database) with:
+
+    python -m pytest -n auto --dist loadfile
+
+--dist loadfile keeps each test module on a single worker, so the data a
+module or class sets up once is only built once rather than once for every
+worker that happens to pick up one of its tests.
+
+The databases live on the local Postgres server unless TEST_DATABASE_SERVER
+says otherwise. Pointing it at a throwaway cluster on a RAM disk with fsync
+turned off takes disk syncs out of the picture entirely:
+
+    initdb -D /dev/shm/pgtest
+    postgres -D /dev/shm/pgtest -p 5433 -F -c full_page_writes=off &
+    TEST_DATABASE_SERVER=postgresql://localhost:5433 python -m pytest
+
+Every test runs on a single database connection inside an outer transaction
+that is never committed. Each test module, each test class, and each test
+within them, is wrapped in its own SAVEPOINT that is rolled back when it
+finishes. Commits made by the models or by the views only release into that
+SAVEPOINT, so no test data ever has to be deleted.
+"""
+
+import os
+from copy import copy
+from hashlib import sha1
+
+import pytest
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+# BEFORE we import our app, let's set an environmental variable
+# to use a different database for tests (we need to do this
+# before we import our app, since that will have already
+# connected to the database). Under pytest-xdist every worker
+# gets a database of its own.
+
+WORKER = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+SERVER = os.environ.get("TEST_DATABASE_SERVER", "postgresql://")
+
+os.environ['DATABASE_URL'] = f"{SERVER}/warbler-test-{WORKER}"
+
+# Hash passwords at bcrypt's minimum cost; the tests only need a valid
+# hash, not a strong one
+
+os.environ['BCRYPT_LOG_ROUNDS'] = "4"
+
+
+# Now we can import app
+
+from app import app
+from models import db, bcrypt, Message, User
+
+# Don't have WTForms use CSRF at all, since it's a pain to test
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+# Let errors in views reach the test instead of becoming 500 pages, and
+# never check templates for changes mid-run. This has to happen before
+# anything touches app.jinja_env, which reads the settings once.
+
+app.config.update(TESTING=True,
+                  TEMPLATES_AUTO_RELOAD=False,
+                  EXPLAIN_TEMPLATE_LOADING=False)
+
+# Keep compiled templates in the temp directory between runs, so each run
+# doesn't parse and compile every template again
+
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
+# Don't record every query for debugging. Left unset, Flask-SQLAlchemy
+# decides from TESTING, so pin it off here; SQLALCHEMY_TRACK_MODIFICATIONS
+# is already off in app.py
+
+app.config['SQLALCHEMY_RECORD_QUERIES'] = False
+
+# Keep a fixed pool of connections for the whole run instead of opening
+# new ones; the engine is only created on first use, below. SQLAlchemy
+# doesn't ping connections on checkout unless asked to, and the one
+# connection the tests run on is held until the end of the session, so
+# it is never reset by being returned to the pool either.
+
+app.config['SQLALCHEMY_POOL_SIZE'] = 10
+app.config['SQLALCHEMY_MAX_OVERFLOW'] = 0
+
+TEMPLATE_DB = "warbler_template"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--rebuild-template", action="store_true",
+        help=f"rebuild the {TEMPLATE_DB} database even if the models "
+             "haven't changed since it was built")
+
+
+def database_url(name):
+    """URL for database `name` on the same server as the test database."""
+
+    url = copy(make_url(app.config['SQLALCHEMY_DATABASE_URI']))
+    url.database = name
+    return url
+
+
+def admin_engine():
+    """Engine for the server's maintenance database, outside transactions."""
+
+    return create_engine(database_url("postgres"), isolation_level="AUTOCOMMIT")
+
+
+def schema_hash():
+    """Hash of the DDL create_all() runs for the current models."""
+
+    dialect = postgresql.dialect()
+    ddl = []
+
+    for table in db.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            ddl.append(str(CreateIndex(index).compile(dialect=dialect)))
+
+    return sha1("\n".join(ddl).encode('UTF-8')).hexdigest()
+
+
+def build_template(admin):
+    """Create the template database with the current schema."""
+
+    admin.execute(f'CREATE DATABASE "{TEMPLATE_DB}"')
+
+    template = create_engine(database_url(TEMPLATE_DB))
+    db.metadata.create_all(template)
+
+    # The test data is thrown away, so skip the write-ahead log for it.
+    # Tables that reference others go first: Postgres won't let a logged
+    # table point at an unlogged one.
+    for table in reversed(db.metadata.sorted_tables):
+        template.execute(f'ALTER TABLE "{table.name}" SET UNLOGGED')
+
+    template.dispose()
+
+    admin.execute(f'ALTER DATABASE "{TEMPLATE_DB}" IS_TEMPLATE true')
+
+    # Record which schema the template was built from
+    admin.execute(
+        f"COMMENT ON DATABASE \"{TEMPLATE_DB}\" IS '{schema_hash()}'")
+
+
+def template_is_current(admin):
+    """Was the template database built from the current models?
+
+    Any change to a table, column or index changes schema_hash(), so
+    it no longer matches the one recorded when the template was built.
+    """
+
+    built_from = admin.execute(
+        text("SELECT shobj_description(oid, 'pg_database') "
+             "FROM pg_database WHERE datname = :name"),
+        name=TEMPLATE_DB).scalar()
+
+    return built_from == schema_hash()
+
+
+def prepare_template(rebuild=False):
+    """Build the template database if it is missing, out of date, or if
+    asked to; otherwise leave it alone, so no DDL runs at all."""
+
+    admin = admin_engine()
+
+    exists = admin.execute(
+        text("SELECT 1 FROM pg_database WHERE datname = :name"),
+        name=TEMPLATE_DB).scalar()
+
+    if exists and not rebuild:
+        rebuild = not template_is_current(admin)
+
+    if rebuild and exists:
+        admin.execute(f'ALTER DATABASE "{TEMPLATE_DB}" IS_TEMPLATE false')
+        admin.execute(f'DROP DATABASE "{TEMPLATE_DB}"')
+
+    if rebuild or not exists:
+        build_template(admin)
+
+    admin.dispose()
+
+
+def create_test_database():
+    """Copy a fresh, empty test database from the template.
+
+    Postgres copies a template at the file level, which is much cheaper
+    than replaying create_all()'s DDL on every run.
+    """
+
+    name = make_url(app.config['SQLALCHEMY_DATABASE_URI']).database
+    admin = admin_engine()
+
+    admin.execute(f'DROP DATABASE IF EXISTS "{name}"')
+    admin.execute(f'CREATE DATABASE "{name}" TEMPLATE "{TEMPLATE_DB}"')
+    admin.dispose()
+
+
+def pytest_sessionstart(session):
+    """Build the template once, before any xdist worker copies it.
+
+    Nothing here (or at import) touches the database when only collecting
+    tests, so --collect-only never waits on Postgres.
+    """
+
+    if session.config.getoption("collectonly"):
+        return
+
+    if "PYTEST_XDIST_WORKER" not in os.environ:
+        prepare_template(session.config.getoption("rebuild_template"))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def connection():
+    """Create the test database once and bind db.session to one connection."""
+
+    create_test_database()
+
+    conn = db.engine.connect()
+    outer = conn.begin()
+    db.session = db.create_scoped_session(options={"bind": conn, "binds": {}})
+
+    yield conn
+
+    db.session.remove()
+    outer.rollback()
+    conn.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cached_password_hashes():
+    """Hash each distinct test password only once per run.
+
+    The cached value is still a real bcrypt hash of that password, so
+    User.authenticate checks it exactly as it would a fresh one.
+    """
+
+    hashes = {}
+    hash_password = bcrypt.generate_password_hash
+
+    def generate_password_hash(password, rounds=None):
+        if (password, rounds) not in hashes:
+            hashes[password, rounds] = hash_password(password, rounds)
+        return hashes[password, rounds]
+
+    bcrypt.generate_password_hash = generate_password_hash
+
+    yield
+
+    del bcrypt.generate_password_hash
+
+
+@pytest.fixture(scope="module")
+def plaintext_passwords():
+    """Store passwords as plain text instead of bcrypt hashes.
+
+    For modules that log users in but aren't testing password hashing
+    itself; the model tests keep checking real hashes.
+    """
+
+    def to_bytes(value):
+        return value.encode('UTF-8') if isinstance(value, str) else value
+
+    def generate_password_hash(password, rounds=None):
+        return to_bytes(password)
+
+    def check_password_hash(pw_hash, password):
+        return to_bytes(pw_hash) == to_bytes(password)
+
+    real = bcrypt.generate_password_hash, bcrypt.check_password_hash
+    bcrypt.generate_password_hash = generate_password_hash
+    bcrypt.check_password_hash = check_password_hash
+
+    yield
+
+    bcrypt.generate_password_hash, bcrypt.check_password_hash = real
+
+
+@pytest.fixture(scope="module", autouse=True)
+def module_savepoint(connection):
+    """Keep rows made by module-scoped fixtures for the whole module, then
+    roll them back."""
+
+    db.session.remove()
+    trans = connection.begin_nested()
+
+    yield
+
+    db.session.remove()
+    trans.rollback()
+
+
+@pytest.fixture(scope="class", autouse=True)
+def class_savepoint(connection):
+    """Keep rows made in setUpClass for the whole class, then roll them back."""
+
+    db.session.remove()
+    trans = connection.begin_nested()
+
+    yield
+
+    db.session.remove()
+    trans.rollback()
+
+
+@pytest.fixture(autouse=True)
+def savepoint(connection):
+    """Roll back everything a test writes to the database.
+
+    If the test (or a view it calls) rolls the session back, that also
+    rolls back this SAVEPOINT, so a new one is started in its place.
+    """
+
+    db.session.remove()
+    trans = connection.begin_nested()
+
+    def restart_savepoint(session, transaction):
+        nonlocal trans
+        if transaction.parent is None and not trans.is_active:
+            trans = connection.begin_nested()
+
+    event.listen(db.session, "after_transaction_end", restart_savepoint)
+
+    yield
+
+    event.remove(db.session, "after_transaction_end", restart_savepoint)
+    db.session.remove()
+    trans.rollback()
+
+
+def insert_sample_data():
+    """Add testuser, testuser2 and a message by testuser2, and commit.
+
+    Returns the new rows' ids, keyed "testuser", "testuser2" and
+    "testmessage2". The users are inserted in one statement instead of
+    going through User.signup. Their passwords go through
+    bcrypt.generate_password_hash, so logging in with "testuser" or
+    "testuser2" works whether or not plaintext_passwords is in use.
+    """
+
+    users = [
+        dict(username="testuser",
+             email="test@test.com",
+             password=bcrypt.generate_password_hash("testuser").decode('UTF-8'),
+             image_url="imageurl"),
+        dict(username="testuser2",
+             email="test2@test.com",
+             password=bcrypt.generate_password_hash("testuser2").decode('UTF-8'),
+             image_url="imageurl"),
+    ]
+
+    ids = dict(db.session.execute(
+        User.__table__.insert()
+        .values(users)
+        .returning(User.username, User.id)).fetchall())
+
+    ids["testmessage2"] = db.session.execute(
+        Message.__table__.insert()
+        .values(text="Hello", user_id=ids["testuser2"])
+        .returning(Message.id)).scalar()
+
+    db.session.commit()
+
+    return ids
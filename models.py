@@ -7,6 +7,7 @@ from xml.dom.minicompat import StringTypes
 from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.orderinglist import ordering_list
 
 bcrypt = Bcrypt()
@@ -204,8 +205,8 @@ class User(db.Model):
         if type(username) is not str or type(email) is not str or type(password) is not str or type(image_url) is not str:
             raise TypeError("All arguments must be strings.")
 
-        if User.query.filter_by(username=username).first():
-            raise ValueError("This username is already taken.")
+        if not username or not email or not password or not image_url:
+            raise ValueError("Required arguments: username, email, password, image_url")
 
         if len(username) <4:
             raise ValueError("Username must be at least 4 characters long.")
@@ -213,9 +214,6 @@ class User(db.Model):
         if len(password) <6:
             raise ValueError("Password must be at least 6 characters long.")
 
-        if not username or not email or not password or not image_url:
-            raise ValueError("Required arguments: username, email, password, image_url")
-
 
         hashed_pwd = bcrypt.generate_password_hash(password).decode('UTF-8')
 
@@ -227,7 +225,15 @@ class User(db.Model):
         )
 
         db.session.add(user)
-        db.session.commit()
+
+        # let the unique constraints catch duplicates rather than
+        # querying for the username before every signup
+        try:
+            db.session.commit()
+        except IntegrityError as err:
+            db.session.rollback()
+            raise ValueError("This username or email is already taken.") from err
+
         return user
 
     @classmethod
@@ -260,3 +266,4 @@ def connect_db(app):
 
     db.app = app
     db.init_app(app)
+    bcrypt.init_app(app)
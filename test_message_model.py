@@ -2,58 +2,39 @@
 
 # run these tests like:
 #
-#    python -m unittest test_message_model.py
+#    python -m pytest test_message_model.py
+#
+# conftest.py points the app at the test database before this module
+# (or the app) is imported.
 
 
-import os
 from unittest import TestCase
 
 from sqlalchemy import null
 
-from models import db, User, Message, Follows
-
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
-
-os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
-
-
-# Now we can import app
-
-from app import app
-
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.create_all()
+from models import User, Message
 
 
 class MessageModelTestCase(TestCase):
-    
-    def setUp(self):
-        """Create test client, add sample data."""
 
-        User.query.delete()
-        Message.query.delete()
-        Follows.query.delete()
+    @classmethod
+    def setUpClass(cls):
+        """Add sample data once for the whole class."""
 
-        self.testuser = User.signup(username="testuser",
-                                    email="test@test.com",
-                                    password="testuser",
-                                    image_url="imgurl")        
+        testuser = User.signup(username="testuser",
+                               email="test@test.com",
+                               password="testuser",
+                               image_url="imgurl")
 
-        self.client = app.test_client()
+        cls.testuser_id = testuser.id
 
     def test_repr(self):
-        msg = Message.add_message("test text", self.testuser.id)
+        msg = Message.add_message("test text", self.testuser_id)
 
         self.assertEqual(msg.__repr__(), f"<Message #{msg.id}: {msg.user}, {msg.timestamp}>")
     
     def test_add_message(self):
-        msg = Message.add_message("test text", self.testuser.id)
+        msg = Message.add_message("test text", self.testuser_id)
 
         self.assertIsInstance(msg, Message)
 
@@ -2,61 +2,38 @@
 
 # run these tests like:
 #
-#    FLASK_ENV=production python -m unittest test_message_views.py
+#    FLASK_ENV=production python -m pytest test_message_views.py
+#
+# conftest.py points the app at the test database before this module
+# (or the app) is imported.
 
 
-import os
 from unittest import TestCase
 
-from models import db, connect_db, Message, User
-
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
-
-os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
-
-
-# Now we can import app
+import pytest
 
+from models import db, connect_db, Message, User
 from app import app, CURR_USER_KEY
+from conftest import insert_sample_data
 
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.create_all()
-
-# Don't have WTForms use CSRF at all, since it's a pain to test
-
-app.config['WTF_CSRF_ENABLED'] = False
+# None of these tests are about password hashing
+pytestmark = pytest.mark.usefixtures("plaintext_passwords")
 
 
 class MessageViewTestCase(TestCase):
     """Test views for messages."""
 
-    def setUp(self):
-        """Create test client, add sample data."""
+    @classmethod
+    def setUpClass(cls):
+        """Create test client and add sample data once for the whole class."""
 
-        User.query.delete()
-        Message.query.delete()
+        ids = insert_sample_data()
 
-        self.client = app.test_client()
+        cls.testuser_id = ids["testuser"]
+        cls.testuser2_id = ids["testuser2"]
+        cls.testmessage2_id = ids["testmessage2"]
 
-        self.testuser = User.signup(username="testuser",
-                                    email="test@test.com",
-                                    password="testuser",
-                                    image_url=None)
-
-        self.testuser2 = User.signup(username="testuser2",
-                                    email="test2@test.com",
-                                    password="testuser2",
-                                    image_url=None)
-
-        self.testmessage2 = Message.add_message(text="Hello", user_id = self.testuser2.id)      
-
-        db.session.commit()
+        cls.client = app.test_client()
 
 
     def test_add_message(self):
@@ -67,17 +44,19 @@ class MessageViewTestCase(TestCase):
 
         with self.client as c:
             with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
+                sess[CURR_USER_KEY] = self.testuser_id
 
             # Now, that session setting is saved, so we can have
             # the rest of ours test
 
             resp = c.post("/messages/new", data={"text": "Hello"})
 
-            # Make sure it redirects
+            # Make sure it redirects to the user's page; that URL has no
+            # message id in it, so the new message still has to be looked up
             self.assertEqual(resp.status_code, 302)
+            self.assertTrue(resp.location.endswith(f"/users/{self.testuser_id}"))
 
-            msg = Message.query.filter_by(user_id=self.testuser.id)[0]
+            msg = Message.query.filter_by(user_id=self.testuser_id).first()
             self.assertEqual(msg.text, "Hello")
 
 
@@ -86,20 +65,15 @@ class MessageViewTestCase(TestCase):
 
         with self.client as c:
             with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            db.session.add(self.testuser2)
-            db.session.add(self.testmessage2)
+                sess[CURR_USER_KEY] = self.testuser_id
 
-            msg = self.testmessage2
-
-            resp = c.get(f"/messages/{msg.id}")
-            html = resp.get_data(as_text=True)
+            resp = c.get(f"/messages/{self.testmessage2_id}")
             
             # Make sure status code 200
             self.assertEqual(resp.status_code, 200)
 
             # Make sure correct html returned
-            self.assertIn('<p class="single-message">Hello</p>', html)
+            self.assertIn(b'<p class="single-message">Hello</p>', resp.data)
 
 
     def test_messages_destroy(self):
@@ -107,39 +81,31 @@ class MessageViewTestCase(TestCase):
 
         with self.client as c:
             with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            db.session.add(self.testuser2)
-            db.session.add(self.testmessage2)
-
-            msg = self.testmessage2
+                sess[CURR_USER_KEY] = self.testuser_id
 
-            resp = c.post(f"/messages/{msg.id}/delete")
+            resp = c.post(f"/messages/{self.testmessage2_id}/delete")
 
             # test redirect
             self.assertEqual(resp.status_code, 302)
 
             # test that message was deleted
-            self.assertIsNone(Message.query.get(msg.id))
+            self.assertFalse(db.session.query(
+                Message.query.filter_by(id=self.testmessage2_id).exists()).scalar())
 
     def test_messages_destroy_redirect(self):
         """Test that messages are deleted"""
 
         with self.client as c:
             with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            db.session.add(self.testuser2)
-            db.session.add(self.testmessage2)
+                sess[CURR_USER_KEY] = self.testuser_id
 
-            msg = self.testmessage2
-
-            resp = c.post(f"/messages/{msg.id}/delete", follow_redirects=True)
-            html = resp.get_data(as_text=True)
+            resp = c.post(f"/messages/{self.testmessage2_id}/delete", follow_redirects=True)
 
             # test redirect
             self.assertEqual(resp.status_code, 200)
 
             # test that message is no longer displayed
-            self.assertNotIn(msg.text, html)
+            self.assertNotIn(b"Hello", resp.data)
 
 
     def test_add_like(self):
@@ -147,119 +113,102 @@ class MessageViewTestCase(TestCase):
 
         with self.client as c:
             with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            db.session.add(self.testuser)
-            db.session.add(self.testuser2)
-            db.session.add(self.testmessage2)
-
-            msg = self.testmessage2
+                sess[CURR_USER_KEY] = self.testuser_id
 
             # like user2's message
-            resp = c.post(f"/messages/like/{msg.id}")
-            html = resp.get_data(as_text=True)
+            resp = c.post(f"/messages/like/{self.testmessage2_id}")
 
             # test status code
             self.assertEqual(resp.status_code, 302)
 
-            # test that msg is in likes
-            self.assertIn(msg, self.testuser.likes)
+            # test that msg is in likes (nothing left to flush; the view
+            # already committed)
+            with db.session.no_autoflush:
+                user = User.query.get(self.testuser_id)
+                msg = Message.query.get(self.testmessage2_id)
+                self.assertIn(msg, user.likes)
 
     def test_add_like_redirect(self):
         """test that likes are added to a message"""
 
         with self.client as c:
             with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            db.session.add(self.testuser)
-            db.session.add(self.testuser2)
-            db.session.add(self.testmessage2)
-
-            msg = self.testmessage2
+                sess[CURR_USER_KEY] = self.testuser_id
 
             # like user2's message
-            resp = c.post(f"/messages/like/{msg.id}", follow_redirects=True)
-            html = resp.get_data(as_text=True)
+            resp = c.post(f"/messages/like/{self.testmessage2_id}", follow_redirects=True)
 
             # test status code
             self.assertEqual(resp.status_code, 200)
 
             # test that msg is included in liked messages
-            self.assertIn("Hello", html)
+            self.assertIn(b"Hello", resp.data)
              
 
     def test_unlike(self):
         """test that message is unliked by signed in user"""
         with self.client as c:
             with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            db.session.add(self.testuser)
-            db.session.add(self.testuser2)
-            db.session.add(self.testmessage2)
+                sess[CURR_USER_KEY] = self.testuser_id
 
-            msg = self.testmessage2
+            user = User.query.get(self.testuser_id)
+            msg = Message.query.get(self.testmessage2_id)
 
             # like message - tested above
-            self.testuser.likes.append(msg)
+            user.likes.append(msg)
 
             # unlike message
             resp = c.post(f"/messages/unlike/{msg.id}")
-            html = resp.get_data(as_text=True)
-
 
             # test status code
             self.assertEqual(resp.status_code, 302)
 
-            # test that msg is in likes
-            self.assertNotIn(msg, self.testuser.likes)
+            # test that msg is not in likes
+            with db.session.no_autoflush:
+                self.assertNotIn(msg, user.likes)
 
     def test_unlike_redirect(self):
         """test that message is unliked by signed in user"""
         with self.client as c:
             with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            db.session.add(self.testuser)
-            db.session.add(self.testuser2)
-            db.session.add(self.testmessage2)
+                sess[CURR_USER_KEY] = self.testuser_id
 
-            msg = self.testmessage2
+            user = User.query.get(self.testuser_id)
+            msg = Message.query.get(self.testmessage2_id)
 
             # like message - tested above
-            self.testuser.likes.append(msg)
+            user.likes.append(msg)
 
             # unlike message
             resp = c.post(f"/messages/unlike/{msg.id}", follow_redirects=True)
-            html = resp.get_data(as_text=True)
 
             # test status code
             self.assertEqual(resp.status_code, 200)
 
             # test that msg icon shows as unliked
-            self.assertNotIn("Hello", html)
+            self.assertNotIn(b"Hello", resp.data)
 
 
     def test_show_likes(self):
         """test that all of users likes are showing"""
         with self.client as c:
             with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            db.session.add(self.testuser)
-            db.session.add(self.testuser2)
-            db.session.add(self.testmessage2)
+                sess[CURR_USER_KEY] = self.testuser_id
 
-            msg = self.testmessage2
+            user = User.query.get(self.testuser_id)
+            msg = Message.query.get(self.testmessage2_id)
 
             # like message - tested above
-            self.testuser.likes.append(msg)
+            user.likes.append(msg)
 
             # go to likes
-            resp = c.get(f"/users/{self.testuser.id}/likes")
-            html = resp.get_data(as_text=True)
+            resp = c.get(f"/users/{self.testuser_id}/likes")
 
             # test status code
             self.assertEqual(resp.status_code, 200)
 
             # test that msg icon shows as unliked
-            self.assertIn("Hello", html)
+            self.assertIn(b"Hello", resp.data)
 
 
     
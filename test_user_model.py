@@ -2,10 +2,12 @@
 
 # run these tests like:
 #
-#    python -m unittest test_user_model.py
+#    python -m pytest test_user_model.py
+#
+# conftest.py points the app at the test database before this module
+# (or the app) is imported.
 
 
-import os
 from sqlite3 import IntegrityError
 from unittest import TestCase
 from xml.dom import InvalidCharacterErr
@@ -13,55 +15,12 @@ from xml.dom import InvalidCharacterErr
 import sqlalchemy
 import psycopg2.errors
 
-from models import db, User, Message, Follows
-
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
-
-os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
-
-
-# Now we can import app
-
-from app import app
-
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.create_all()
+from models import db, bcrypt, User
 
 
 class UserModelTestCase(TestCase):
     """Test views for messages."""
 
-    def setUp(self):
-        """Create test client, add sample data."""
-        db.session.rollback()
-        User.query.delete()
-        Message.query.delete()
-        Follows.query.delete()
-
-        self.client = app.test_client()
-
-    def test_attributes(self):
-        """Does basic model work?"""
-
-        u = User(
-            email="test@test.com",
-            username="testuser",
-            password="HASHED_PASSWORD"
-        )
-
-        db.session.add(u)
-        db.session.commit()
-
-        # User should have no messages & no followers
-        self.assertEqual(len(u.messages), 0)
-        self.assertEqual(len(u.followers), 0)
-
     def test_repr(self):
         """Does repr method work as expected"""
         u = User(email="test@test.com",
@@ -73,8 +32,10 @@ class UserModelTestCase(TestCase):
 
         self.assertEqual(u.__repr__(), f"<User #{u.id}: {u.username}, {u.email}>")
 
-    def test_is_following(self):
-        """Does is_following successfully detect when user1 is or isn't following user2"""
+    def test_follow_relationships(self):
+        """Does basic model work, and do is_following / is_followed_by
+        detect when user1 is or isn't following / followed by user2?"""
+
         u1 = User(email="test@test.com",
             username="testuser",
             password="HASHED_PASSWORD")
@@ -87,33 +48,24 @@ class UserModelTestCase(TestCase):
         db.session.add(u2)
         db.session.commit()
 
-        self.assertFalse(u1.is_following(u2))
-        
-        u1.following.append(u2)
+        with self.subTest("attributes"):
+            # User should have no messages & no followers
+            self.assertEqual(len(u1.messages), 0)
+            self.assertEqual(len(u1.followers), 0)
 
-        self.assertTrue(u1.is_following(u2))
+        with self.subTest("is_following"):
+            self.assertFalse(u1.is_following(u2))
 
+            u1.following.append(u2)
 
-    def test_is_followed_by(self):
-        """Does is_followed_by successfully detect when user1 is and is not followed by user2?"""
+            self.assertTrue(u1.is_following(u2))
 
-        u1 = User(email="test@test.com",
-            username="testuser",
-            password="HASHED_PASSWORD")
+        with self.subTest("is_followed_by"):
+            self.assertFalse(u1.is_followed_by(u2))
 
-        u2 = User(email="test2@test.com", 
-            username="testuser2", 
-            password="HASHED_PASSWORD_2")
+            u1.followers.append(u2)
 
-        db.session.add(u1)
-        db.session.add(u2)
-        db.session.commit()
-
-        self.assertFalse(u1.is_followed_by(u2))
-
-        u1.followers.append(u2)
-
-        self.assertTrue(u1.is_followed_by(u2))
+            self.assertTrue(u1.is_followed_by(u2))
 
 
     def test_create_valid_user(self):
@@ -125,22 +77,22 @@ class UserModelTestCase(TestCase):
         self.assertIsInstance(user, User)
 
     def test_signup_duplicate_username(self):
-        user = User.signup("test", "test@test.com", "password", "imageurl") 
+        user = User(username="test", email="test@test.com",
+                    password=bcrypt.generate_password_hash("password").decode('UTF-8'),
+                    image_url="imageurl")
 
         db.session.add(user)
         db.session.commit()
 
-        self.assertRaises(ValueError, User.signup, "test", "test@test.com", "password", "imageurl")
+        self.assertRaises(ValueError, User.signup, "test", "test2@test.com", "password", "imageurl")
 
     def test_signup_required_fields(self):
-
-        self.assertRaises(ValueError, User.signup, "", "test@test.com", "password", "imageurl")
-
-        self.assertRaises(ValueError, User.signup, "username", "", "password", "imageurl")
-
-        self.assertRaises(ValueError, User.signup, "username", "test@test.com", "", "imageurl")
-
-        self.assertRaises(ValueError, User.signup, "username", "test@test.com", "password", "")
+        for args in [("", "test@test.com", "password", "imageurl"),
+                     ("username", "", "password", "imageurl"),
+                     ("username", "test@test.com", "", "imageurl"),
+                     ("username", "test@test.com", "password", "")]:
+            with self.subTest(args=args):
+                self.assertRaises(ValueError, User.signup, *args)
 
     def test_signup_min_length_fields(self):
         self.assertRaises(ValueError, User.signup, "u", "test@test.com", "password", "imageurl")
@@ -148,13 +100,17 @@ class UserModelTestCase(TestCase):
         self.assertRaises(ValueError, User.signup, "username", "test@test.com", "pw", "imageurl")
 
     def test_signup_field_types(self):
-        self.assertRaises(TypeError, User.signup, [], "test@test.com", "password", "imageurl")
-        self.assertRaises(TypeError, User.signup, "username", True, "password", "imageurl")
-        self.assertRaises(TypeError, User.signup, "username", "test@test.com", 7, "imageurl")
-        self.assertRaises(TypeError, User.signup, "username", "test@test.com", "password", {})
+        for args in [([], "test@test.com", "password", "imageurl"),
+                     ("username", True, "password", "imageurl"),
+                     ("username", "test@test.com", 7, "imageurl"),
+                     ("username", "test@test.com", "password", {})]:
+            with self.subTest(args=args):
+                self.assertRaises(TypeError, User.signup, *args)
 
     def test_authenticate_valid_user(self):
-        user = User.signup("username", "test@test.com", "password", "imageurl")
+        user = User(username="username", email="test@test.com",
+                    password=bcrypt.generate_password_hash("password").decode('UTF-8'),
+                    image_url="imageurl")
 
         db.session.add(user)
         db.session.commit()
@@ -163,7 +119,9 @@ class UserModelTestCase(TestCase):
 
     def test_authenticate_invalid_user(self):
 
-        user = User.signup("username", "test@test.com", "password", "imageurl")
+        user = User(username="username", email="test@test.com",
+                    password=bcrypt.generate_password_hash("password").decode('UTF-8'),
+                    image_url="imageurl")
 
         db.session.add(user)
         db.session.commit()
@@ -2,534 +2,339 @@
 
 # run these tests like:
 #
-#    FLASK_ENV=production python -m unittest test_user_views.py
-
-
-import os
-from unittest import TestCase
-
-from models import db, connect_db, Message, User
-
-# BEFORE we import our app, let's set an environmental variable
-# to use a different database for tests (we need to do this
-# before we import our app, since that will have already
-# connected to the database
-
-os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
-
-
-# Now we can import app
-
-from app import app, CURR_USER_KEY
-
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.create_all()
-
-# Don't have WTForms use CSRF at all, since it's a pain to test
-
-app.config['WTF_CSRF_ENABLED'] = False
-
-
-class LoggedInUserViewTestCase(TestCase):
-    """Test views for user when logged in."""
-
-    def setUp(self):
-        """Create test client, add sample data."""
-
-        User.query.delete()
-        Message.query.delete()
-
-        self.client = app.test_client()
-
-        self.testuser = User.signup(username="testuser",
-                                    email="test@test.com",
-                                    password="testuser",
-                                    image_url="imageurl")
-
-        self.testuser2 = User.signup(username="testuser2",
-                                    email="test2@test.com",
-                                    password="testuser2",
-                                    image_url="imageurl")
-
-        self.testmessage2 = Message.add_message(text="Hello", user_id = self.testuser2.id)      
-
-        db.session.commit()
-
-
-    def test_list_users(self):
-        """Test that users are being listed"""
-
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-
-            resp = c.get("/users")
-            html = resp.get_data(as_text=True)
-
-            # Test that status code is 200
-            self.assertEqual(resp.status_code, 200)
-
-            # Test that test user is listed
-            self.assertIn(self.testuser.username, html)
-
-    def test_users_show(self):
-        """Test that a user profile is properly displayed"""
-
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-
-            user = self.testuser2
-            db.session.add(user)
-            resp = c.get(f"/users/{user.id}")
-            html = resp.get_data(as_text=True)
-
-            # Test status code is 200
-            self.assertEqual(resp.status_code, 200)
-
-            # Test that user profile is displayed
-            self.assertIn('<h4 id="sidebar-username">@testuser2</h4>', html)
-    
-
-    def test_show_following(self):
-        """Test that following is properly displayed"""
-
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-
-            user = self.testuser2
-            following = self.testuser
-
-            db.session.add(user)
-
-            # Follow user
-            user.following.append(following)
-
-            # Display following
-            resp = c.get(f"/users/{user.id}/following")
-            html = resp.get_data(as_text=True)
-
-            # Test status code is 200
-            self.assertEqual(resp.status_code, 200)
-
-            # Test that following list is displayed
-            self.assertIn('<p>@testuser</p>', html)
-
-
-    def test_show_followers(self):
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-
-            user = self.testuser2
-            follower = self.testuser
-
-            db.session.add(follower)
-
-            # Add follower
-            follower.following.append(user)
-
-            # Display followers
-            resp = c.get(f"/users/{user.id}/followers")
-            html = resp.get_data(as_text=True)
-
-            # Test status code is 200
-            self.assertEqual(resp.status_code, 200)
-
-            # Test that followers list is displayed
-            self.assertIn('<p>@testuser</p>', html)
-
-
-    def test_add_follow(self):
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-
-            user = self.testuser
-            following = self.testuser2
+#    FLASK_ENV=production python -m pytest test_user_views.py
+#
+# conftest.py points the app at the test database before this module
+# (or the app) is imported.
 
-            db.session.add(user)
-            db.session.add(following)
 
-            # Follow
-            resp = c.post(f"/users/follow/{following.id}")
+import pytest
+from flask import g
 
-            # Test status code is 302
-            self.assertEqual(resp.status_code, 302)
+from models import db, User
+from app import app, CURR_USER_KEY, add_follow, stop_following, delete_user
+from conftest import insert_sample_data
 
-            # Test user was followed
-            self.assertIn(following, user.following)
+# None of these tests are about password hashing
+pytestmark = pytest.mark.usefixtures("plaintext_passwords")
 
 
-    def test_stop_following(self):
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
+@pytest.fixture(scope="module")
+def seed():
+    """Add sample data once for the whole module, return the new rows' ids."""
 
-            user = self.testuser
-            following = self.testuser2
+    return insert_sample_data()
 
-            db.session.add(user)
-            db.session.add(following)
 
-            # Follow
-            user.following.append(following)
-            self.assertIn(following, user.following)
+@pytest.fixture(scope="module")
+def module_client():
+    """One test client for the whole module."""
 
-            # Unfollow
-            resp = c.post(f"/users/stop-following/{following.id}")
+    return app.test_client()
 
-            # Test status code is 302
-            self.assertEqual(resp.status_code, 302)
 
-            # Test user was unfollowed
-            self.assertNotIn(following, user.following)
+@pytest.fixture
+def client(module_client):
+    """The module's test client, with nobody logged in."""
 
+    module_client.cookie_jar.clear()
+    return module_client
 
-    def test_update_profile(self):
-        """Test that edit profile form is properly displayed"""
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
 
-            # Get resp
-            resp = c.get(f"/users/profile")
-            html = resp.get_data(as_text=True)
+@pytest.fixture
+def testuser(seed):
+    """testuser, loaded into this test's session."""
 
-            # Test that status code is 200
-            self.assertEqual(resp.status_code, 200)
+    return User.query.get(seed["testuser"])
 
-            # Test that edit profile form is shown
-            self.assertIn('id="user_form"', html)
 
-            # Test that form is populated with original values
-            self.assertIn("test@test.com", html)
-             
-        
-    def test_update_profile_post(self):
-        """Test that user info is properly updated in db"""
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            
-            db.session.add(self.testuser)
+@pytest.fixture
+def testuser2(seed):
+    """testuser2, loaded into this test's session."""
 
-            # Get resp
-            resp = c.post(f"/users/profile", data={"username": "testtest", "email": "testuser@test.com", "bio":"this is a test", "password":"testuser"})
-            html = resp.get_data(as_text=True)
+    return User.query.get(seed["testuser2"])
 
-            # Test that status code is 302
-            self.assertEqual(resp.status_code, 302)
 
-            # Test that db was updated
-            self.assertEqual(self.testuser.email, "testuser@test.com")
-            self.assertEqual(self.testuser.username, "testtest")
-            self.assertEqual(self.testuser.bio, "this is a test")
+@pytest.fixture
+def logged_in_client(request, client, seed):
+    """Test client logged in as testuser.
 
+    session_transaction() ends an app context, which removes db.session and
+    detaches anything already loaded into it, so the test's user fixtures
+    are put back into the new session afterwards.
+    """
 
-    def test_update_profile_post_redirect(self):
-        """Test that displayed user profile was edited after redirect"""
+    with client.session_transaction() as sess:
+        sess[CURR_USER_KEY] = seed["testuser"]
 
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            
-            db.session.add(self.testuser)
+    for name in ("testuser", "testuser2"):
+        if name in request.fixturenames:
+            db.session.add(request.getfixturevalue(name))
 
-            # Get resp
-            resp = c.post(f"/users/profile", data={"username": "testtest", "email": "testuser@test.com", "bio":"this is a test", "password":"testuser"}, follow_redirects=True)
-            html = resp.get_data(as_text=True)
+    return client
 
-            # Test that status code is 200
-            self.assertEqual(resp.status_code, 200)
 
-            # Test that updated info is displayed on profile view
-            self.assertIn("@testtest", html)
-            self.assertIn("this is a test", html)
+##############################################################################
+# Logged in
 
 
-    def test_delete_user(self):
-        """Test that user is properly deleted from database"""
+def test_list_users(logged_in_client, testuser):
+    """Test that users are being listed"""
 
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            
-            db.session.add(self.testuser)
+    with logged_in_client as c:
 
-            # Delete user
-            resp = c.post(f"/users/delete")
+        resp = c.get("/users")
 
-            # Test status code 302
-            self.assertEqual(resp.status_code, 302)
+        # Test that status code is 200
+        assert resp.status_code == 200
 
-            # Test that user was removed from db
-            self.assertNotIn(self.testuser, User.query.all())
+        # Test that test user is listed
+        assert testuser.username.encode() in resp.data
 
-    def test_delete_user_redirect(self):
-        """Test redirect to signup page upon profile deletion"""
 
-        with self.client as c:
-            with c.session_transaction() as sess:
-                sess[CURR_USER_KEY] = self.testuser.id
-            
-            db.session.add(self.testuser)
+def test_users_show(logged_in_client, testuser2):
+    """Test that a user profile is properly displayed"""
 
-            # Delete user
-            resp = c.post(f"/users/delete", follow_redirects=True)
-            html = resp.get_data(as_text=True)
+    with logged_in_client as c:
 
-            # Test status code 200
-            self.assertEqual(resp.status_code, 200)
+        user = testuser2
+        resp = c.get(f"/users/{user.id}")
 
-            # Test that signup page is displayed
-            self.assertIn('<h2 class="join-message">Join Warbler today.</h2>', html)
+        # Test status code is 200
+        assert resp.status_code == 200
 
-class LoggedOutUserViewTestCase(TestCase):
-    """Test views for user when logged out."""
+        # Test that user profile is displayed
+        assert b'<h4 id="sidebar-username">@testuser2</h4>' in resp.data
 
-    def setUp(self):
-        """Create test client, add sample data."""
 
-        User.query.delete()
-        Message.query.delete()
+def test_show_following(logged_in_client, testuser, testuser2):
+    """Test that following is properly displayed"""
 
-        self.client = app.test_client()
+    with logged_in_client as c:
 
-        self.testuser = User.signup(username="testuser",
-                                    email="test@test.com",
-                                    password="testuser",
-                                    image_url="imageurl")
+        user = testuser2
+        following = testuser
 
-        self.testuser2 = User.signup(username="testuser2",
-                                    email="test2@test.com",
-                                    password="testuser2",
-                                    image_url="imageurl")
+        # Follow user
+        user.following.append(following)
 
-        self.testmessage2 = Message.add_message(text="Hello", user_id = self.testuser2.id)      
+        # Display following
+        resp = c.get(f"/users/{user.id}/following")
 
-        db.session.commit()  
+        # Test status code is 200
+        assert resp.status_code == 200
 
-    def test_show_following(self):
-        """Test that page cannot be viewed when logged out"""
+        # Test that following list is displayed
+        assert b'<p>@testuser</p>' in resp.data
 
-        with self.client as c:
 
-            user = self.testuser2
+def test_show_followers(logged_in_client, testuser, testuser2):
+    with logged_in_client as c:
 
-            # Display following
-            resp = c.get(f"/users/{user.id}/following")
-            html = resp.get_data(as_text=True)
+        user = testuser2
+        follower = testuser
 
-            # Test status code is 302
-            self.assertEqual(resp.status_code, 302)
+        # Add follower
+        follower.following.append(user)
 
-    def test_show_following_redirect(self):
-        """Test that logged out user is properly redirected"""
+        # Display followers
+        resp = c.get(f"/users/{user.id}/followers")
 
-        with self.client as c:
+        # Test status code is 200
+        assert resp.status_code == 200
 
-            user = self.testuser2
+        # Test that followers list is displayed
+        assert b'<p>@testuser</p>' in resp.data
 
-            # Display following
-            resp = c.get(f"/users/{user.id}/following", follow_redirects=True)
-            html = resp.get_data(as_text=True)
 
-            # Test status code is 200
-            self.assertEqual(resp.status_code, 200)
+# test_add_follow, test_stop_following and test_delete_user only check what
+# the view did to the database, so they call it directly inside a request
+# context instead of going through the test client. That skips the
+# before_request hook, so g.user is set by hand.
 
-            # Test redirected to signup page
-            self.assertIn('<div class="alert alert-danger">Access unauthorized.</div>', html)
-            self.assertIn('<p>Sign up now to get your own personalized timeline!</p>', html)
 
-    def test_show_followers(self):
-        """Test that page cannot be viewed when logged out"""
+def test_add_follow(testuser, testuser2):
+    user = testuser
+    following = testuser2
 
-        with self.client as c:
+    with app.test_request_context(f"/users/follow/{following.id}", method="POST"):
+        g.user = user
 
-            user = self.testuser2
+        # Follow
+        resp = add_follow(following.id)
 
-            # Display followers
-            resp = c.get(f"/users/{user.id}/followers")
-            html = resp.get_data(as_text=True)
+        # Test redirected to following list
+        assert resp.status_code == 302
+        assert resp.location.endswith(f"/users/{user.id}/following")
 
-            # Test status code is 302
-            self.assertEqual(resp.status_code, 302)
+        # Test user was followed
+        assert following in user.following
 
-    def test_show_followers_redirect(self):
-        """Test that logged out user is properly redirected"""
-        with self.client as c:
 
-            user = self.testuser2
+def test_stop_following(testuser, testuser2):
+    user = testuser
+    following = testuser2
 
-            # Display followers
-            resp = c.get(f"/users/{user.id}/followers", follow_redirects=True)
-            html = resp.get_data(as_text=True)
+    with app.test_request_context(f"/users/stop-following/{following.id}", method="POST"):
+        g.user = user
 
-            # Test status code is 200
-            self.assertEqual(resp.status_code, 200)
+        # Follow
+        user.following.append(following)
+        assert following in user.following
 
-            # Test redirected to signup page
-            self.assertIn('<div class="alert alert-danger">Access unauthorized.</div>', html)
-            self.assertIn('<p>Sign up now to get your own personalized timeline!</p>', html)
+        # Unfollow
+        resp = stop_following(following.id)
 
+        # Test redirected to following list
+        assert resp.status_code == 302
+        assert resp.location.endswith(f"/users/{user.id}/following")
 
-    def test_add_follow(self):
-        """Test that user cannot follow when logged out"""
+        # Test user was unfollowed
+        assert following not in user.following
 
-        with self.client as c:
 
-            following = self.testuser2
+def test_update_profile(logged_in_client):
+    """Test that edit profile form is properly displayed"""
+    with logged_in_client as c:
 
-            db.session.add(following)
+        # Get resp
+        resp = c.get(f"/users/profile")
 
-            # Follow
-            resp = c.post(f"/users/follow/{following.id}")
+        # Test that status code is 200
+        assert resp.status_code == 200
 
-            # Test status code is 302
-            self.assertEqual(resp.status_code, 302)
+        # Test that edit profile form is shown
+        assert b'id="user_form"' in resp.data
 
+        # Test that form is populated with original values
+        assert b"test@test.com" in resp.data
 
-    def test_add_follow_redirect(self):
-        """Test that logged out user is properly redirected"""
-        with self.client as c:
 
-            following = self.testuser2
+def test_update_profile_post(logged_in_client, testuser):
+    """Test that user info is properly updated in db"""
+    with logged_in_client as c:
 
-            db.session.add(following)
+        # Get resp
+        resp = c.post(f"/users/profile", data={"username": "testtest", "email": "testuser@test.com", "bio":"this is a test", "password":"testuser"})
 
-            # Follow
-            resp = c.post(f"/users/follow/{following.id}", follow_redirects=True)
-            html = resp.get_data(as_text=True)
+        # Test redirected to user profile
+        assert resp.status_code == 302
+        assert resp.location.endswith(f"/users/{testuser.id}")
 
-            # Test status code is 200
-            self.assertEqual(resp.status_code, 200)
+        # Test that db was updated
+        assert testuser.email == "testuser@test.com"
+        assert testuser.username == "testtest"
+        assert testuser.bio == "this is a test"
 
-            # Test redirected to signup page
-            self.assertIn('<div class="alert alert-danger">Access unauthorized.</div>', html)
-            self.assertIn('<p>Sign up now to get your own personalized timeline!</p>', html)
 
-    def test_stop_following(self):
-        """Test that user cannot stop following when logged out"""
+def test_update_profile_post_redirect(logged_in_client):
+    """Test that displayed user profile was edited after redirect"""
 
-        with self.client as c:
- 
-            following = self.testuser2
+    with logged_in_client as c:
 
-            db.session.add(following)
+        # Get resp
+        resp = c.post(f"/users/profile", data={"username": "testtest", "email": "testuser@test.com", "bio":"this is a test", "password":"testuser"}, follow_redirects=True)
 
-            # Unfollow
-            resp = c.post(f"/users/stop-following/{following.id}")
+        # Test that status code is 200
+        assert resp.status_code == 200
 
-            # Test status code is 302
-            self.assertEqual(resp.status_code, 302)
+        # Test that updated info is displayed on profile view
+        assert b"@testtest" in resp.data
+        assert b"this is a test" in resp.data
 
 
-    def test_stop_following_redirect(self):
-        """Test that logged out user is properly redirected"""
-        with self.client as c:
+def test_delete_user(testuser):
+    """Test that user is properly deleted from database"""
 
-            following = self.testuser2
+    user_id = testuser.id
 
-            db.session.add(following)
+    with app.test_request_context("/users/delete", method="POST"):
+        g.user = testuser
 
-            # Unfollow
-            resp = c.post(f"/users/stop-following/{following.id}", follow_redirects=True)
-            html = resp.get_data(as_text=True)
+        # Delete user
+        resp = delete_user()
 
-            # Test status code is 200
-            self.assertEqual(resp.status_code, 200)
+        # Test redirected to signup page
+        assert resp.status_code == 302
+        assert resp.location.endswith("/signup")
 
-            # Test redirected to signup page
-            self.assertIn('<div class="alert alert-danger">Access unauthorized.</div>', html)
-            self.assertIn('<p>Sign up now to get your own personalized timeline!</p>', html)
+        # Test that user was removed from db
+        assert User.query.get(user_id) is None
 
-    def test_update_profile(self):
-        """Test that page cannot be viewed when logged out"""
 
-        with self.client as c:
+def test_delete_user_redirect(logged_in_client):
+    """Test redirect to signup page upon profile deletion"""
 
-            # Get resp
-            resp = c.get(f"/users/profile")
-            html = resp.get_data(as_text=True)
+    with logged_in_client as c:
 
-            # Test that status code is 302
-            self.assertEqual(resp.status_code, 302)
+        # Delete user
+        resp = c.post(f"/users/delete", follow_redirects=True)
 
-             
-    def test_update_profile_redirect(self):
-        """Test that logged out user is properly redirected"""
-        with self.client as c:
+        # Test status code 200
+        assert resp.status_code == 200
 
-            # Get resp
-            resp = c.get(f"/users/profile", follow_redirects=True)
-            html = resp.get_data(as_text=True)
+        # Test that signup page is displayed
+        assert b'<h2 class="join-message">Join Warbler today.</h2>' in resp.data
 
-            # Test that status code is 200
-            self.assertEqual(resp.status_code, 200)
 
-            # Test redirected to signup page
-            self.assertIn('<div class="alert alert-danger">Access unauthorized.</div>', html)
-            self.assertIn('<p>Sign up now to get your own personalized timeline!</p>', html)
-        
-    def test_update_profile_post(self):
-        """Test that profile cannot be updated when logged out"""
+##############################################################################
+# Logged out
 
-        with self.client as c:
 
-            # Get resp
-            resp = c.post(f"/users/profile", data={"username": "testtest", "email": "testuser@test.com", "bio":"this is a test", "password":"testuser"})
-            html = resp.get_data(as_text=True)
+# Every page that needs a logged in user, as (method, url, form data); the
+# urls are filled in with the ids from seed
+PROFILE_FORM = {"username": "testtest", "email": "testuser@test.com",
+                "bio": "this is a test", "password": "testuser"}
 
-            # Test that status code is 302
-            self.assertEqual(resp.status_code, 302)
+LOGIN_REQUIRED = [
+    ("GET", "/users/{testuser2}/following", None),
+    ("GET", "/users/{testuser2}/followers", None),
+    ("POST", "/users/follow/{testuser2}", None),
+    ("POST", "/users/stop-following/{testuser2}", None),
+    ("GET", "/users/profile", None),
+    ("POST", "/users/profile", PROFILE_FORM),
+    ("POST", "/users/delete", None),
+]
 
-    def test_update_profile_post_redirect(self):
-        """Test that logged out user is properly redirected"""
-        with self.client as c:
 
-            # Get resp
-            resp = c.post(f"/users/profile", data={"username": "testtest", "email": "testuser@test.com", "bio":"this is a test", "password":"testuser"}, follow_redirects=True)
-            html = resp.get_data(as_text=True)
+@pytest.mark.parametrize("method, url, data", LOGIN_REQUIRED)
+def test_logged_out(client, seed, method, url, data):
+    """Test that page cannot be used when logged out"""
 
-            # Test that status code is 200
-            self.assertEqual(resp.status_code, 200)
+    resp = client.open(url.format(**seed), method=method, data=data)
 
-            # Test redirected to signup page
-            self.assertIn('<div class="alert alert-danger">Access unauthorized.</div>', html)
-            self.assertIn('<p>Sign up now to get your own personalized timeline!</p>', html)
+    # Test redirected to the homepage, without rendering anything
+    assert resp.status_code == 302
+    assert resp.location == "http://localhost/"
 
 
-    def test_delete_user(self):
-        """Test that user cannot be deleted when logged out"""
+@pytest.mark.parametrize("method, url, data", LOGIN_REQUIRED)
+def test_logged_out_redirect(client, seed, method, url, data):
+    """Test that logged out user is properly redirected"""
 
-        with self.client as c:
+    resp = client.open(url.format(**seed), method=method, data=data,
+                       follow_redirects=True)
 
-            # Delete user
-            resp = c.post(f"/users/delete")
+    # Test status code is 200
+    assert resp.status_code == 200
 
-            # Test status code 302
-            self.assertEqual(resp.status_code, 302)
+    # Test redirected to signup page
+    assert b'<div class="alert alert-danger">Access unauthorized.</div>' in resp.data
+    assert b'<p>Sign up now to get your own personalized timeline!</p>' in resp.data
 
 
-    def test_delete_user_redirect(self):
-        """Test that logged out user is properly redirected"""
+##############################################################################
+# Signup
 
-        with self.client as c:
 
-            # Delete user
-            resp = c.post(f"/users/delete", follow_redirects=True)
-            html = resp.get_data(as_text=True)
+def test_signup_duplicate_username(client, seed):
+    """Test that a taken username re-presents the signup form"""
 
-            # Test status code 200
-            self.assertEqual(resp.status_code, 200)
+    resp = client.post("/signup", data={"username": "testuser", "email": "new@test.com", "password": "password"})
 
-        # Test redirected to signup page
-            self.assertIn('<div class="alert alert-danger">Access unauthorized.</div>', html)
-            self.assertIn('<p>Sign up now to get your own personalized timeline!</p>', html)
+    # Test status code is 200
+    assert resp.status_code == 200
 
-            
+    # Test that the error is flashed and the form shown again
+    assert b'<div class="alert alert-danger">This username or email is already taken.</div>' in resp.data
+    assert b'id="user_form"' in resp.data